@@ -21,22 +21,136 @@ SOFTWARE.
 '''
 
 import argparse
+import base64
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
 import datetime
-from halo import Halo
+from tqdm import tqdm
 
+import json
 import logging
 import os
+import shutil
+import socket
+import subprocess
 import time
 
 import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
 SIGNINT = False
+STOP = threading.Event()
 RATE_LIMIT_WAIT_TIME_S = 10
 RATE_LIMIT_WARNING_THRESHOLD = 10
+RATE_LIMIT_RETRIES = 3
+REQUEST_TIMEOUT = (5, 60)
+DOWNLOAD_TIMEOUT = (5, 300)
+DEFAULT_WORKERS = 8
+COPY_BUFFER_SIZE = 1 << 20
+
+# Compressor command and archive extension for the --compress option.
+# pigz and zstd spread the work across all cores; plain gzip is
+# single-threaded.
+COMPRESSORS = {
+    'gzip': (['gzip', '-c'], 'tar.gz'),
+    'pigz': (['pigz', '-p', str(os.cpu_count() or 1), '-c'], 'tar.gz'),
+    'zstd': (['zstd', '-T0', '-q', '-c'], 'tar.zst'),
+}
+# Hosts contacted during a backup: the API, the archive endpoints and
+# the codeload host the archive redirects land on.
+GITHUB_HOSTS = ('api.github.com', 'github.com', 'codeload.github.com')
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+
+# One page of repositories with their default branch and branch names,
+# replacing one REST call per repository for the branch listings.
+GRAPHQL_REPOS_QUERY = '''
+query($login: String!, $after: String) {
+  user(login: $login) {
+    repositories(first: 100, after: $after, ownerAffiliations: OWNER) {
+      pageInfo { endCursor hasNextPage }
+      nodes {
+        name
+        pushedAt
+        defaultBranchRef { name }
+        refs(refPrefix: "refs/heads/", first: 100) {
+          pageInfo { hasNextPage }
+          nodes { name }
+        }
+      }
+    }
+  }
+}
+'''
+
+_thread_local = threading.local()
+
+
+def make_session(headers, pool_maxsize=32):
+    """
+    Create a requests session with connection pooling and retries.
+
+    A single session reuses TCP/TLS connections to GitHub across requests
+    (keep-alive), avoiding a new handshake per repository and per branch.
+    The session is thread-safe for concurrent GET requests.
+
+    Args:
+        headers (dict): Default headers to send with every request.
+        pool_maxsize (int, optional): Maximum number of pooled connections
+            per host. Should match the number of download workers.
+
+    Returns:
+        Session: The configured requests session.
+    """
+    session = requests.Session()
+    session.headers.update(headers)
+
+    # Block instead of opening throwaway connections when all pool slots
+    # are busy, so concurrent workers multiplex over the same warm
+    # connections rather than paying extra TLS handshakes.
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        pool_block=True,
+        max_retries=Retry(total=3, backoff_factor=0.5,
+                          status_forcelist=[502, 503, 504]),
+    )
+    for host in GITHUB_HOSTS:
+        session.mount(f'https://{host}', adapter)
+
+    return session
+
+
+def warm_connections(session):
+    """
+    Pre-resolve DNS and open TLS connections to the GitHub hosts.
+
+    The first request to each host otherwise pays a DNS lookup plus a
+    full TLS handshake; doing both once up front lets the parallel
+    downloads start on warm, kept-alive connections and a primed
+    resolver cache.
+
+    Args:
+        session (Session): The requests session to warm.
+
+    Returns:
+        None
+    """
+    for host in GITHUB_HOSTS:
+        start = time.monotonic()
+        try:
+            socket.getaddrinfo(host, 443)
+            session.head(f'https://{host}/', timeout=REQUEST_TIMEOUT)
+        except (OSError, requests.exceptions.RequestException):
+            continue
+        logging.debug(
+            f'Warmed {host} in {(time.monotonic() - start) * 1000:.0f} ms')
 
 
 def signal_handler(_, __):
@@ -52,6 +166,7 @@ def signal_handler(_, __):
     """
     global SIGNINT
     SIGNINT = True
+    STOP.set()
 
 
 def sizeof_fmt(num, suffix="B"):
@@ -69,11 +184,27 @@ def sizeof_fmt(num, suffix="B"):
         This function is based on the Stack Overflow answer by Fred Cirera.
         Link: https://stackoverflow.com/a/1094933
     """
-    for unit in ("", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi"):
-        if abs(num) < 1024.0:
-            return f"{num:3.1f}{unit}{suffix}"
-        num /= 1024.0
-    return f"{num:.1f}Yi{suffix}"
+    if num == 0:
+        return f"0.0{suffix}"
+
+    units = ("", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi", "Yi")
+    i = min((int(num).bit_length() - 1) // 10, len(units) - 1)
+    return f"{num / (1 << (10 * i)):3.1f}{units[i]}{suffix}"
+
+
+def log_fmt(message, name, branch):
+    """
+    Format a progress line for a repository and branch.
+
+    Args:
+        message (str): The action being reported.
+        name (str): The repository name.
+        branch (str): The branch name.
+
+    Returns:
+        str: The formatted line.
+    """
+    return f'{message:8s}  {name:20s} {("[" + branch + "]"):20s}'
 
 
 def rate_limit_check(r):
@@ -88,29 +219,29 @@ def rate_limit_check(r):
     """
 
     if 'X-RateLimit-Remaining' in r.headers and int(r.headers['X-RateLimit-Remaining']) < RATE_LIMIT_WARNING_THRESHOLD:
-        logging.warning('Approaching rate limit')
-        wait_time_s = RATE_LIMIT_WAIT_TIME_S
-        spinner = Halo(
-            spinner='dots', text=f'Approaching rate limit. Waiting {wait_time_s} seconds.', color='yellow')
-        spinner.start()
+        reset = int(r.headers.get(
+            'X-RateLimit-Reset', time.time() + RATE_LIMIT_WAIT_TIME_S))
+        wait_time_s = max(0, reset - int(time.time())) + 1
+        logging.warning(
+            f'Approaching rate limit. Waiting {wait_time_s} seconds.')
 
-        for i in range(0, wait_time_s):
-            spinner.text = f'Approaching rate limit. Waiting {wait_time_s - i} seconds.'
-            if SIGNINT:
-                spinner.stop()
-                exit(0)
-            time.sleep(1)
+        if STOP.wait(wait_time_s):
+            exit(0)
 
-        spinner.stop()
 
-
-def make_request(url, headers):
+def make_request(session, url, stream=False, headers=None, allow_statuses=()):
     """
     Makes a request to the GitHub API.
 
     Args:
+        session (Session): The requests session to use.
         url (str): The URL to make the request to.
-        headers (dict): The headers to include in the request.
+        stream (bool, optional): Stream the response body instead of
+            downloading it immediately. Defaults to False.
+        headers (dict, optional): Extra headers merged over the session
+            defaults for this request only.
+        allow_statuses (tuple, optional): Error status codes returned to
+            the caller instead of being treated as fatal.
 
     Returns:
         Response: The HTTP response object.
@@ -119,9 +250,39 @@ def make_request(url, headers):
         SystemExit: If there is a connection error, timeout, or too many redirects.
     """
     try:
-        r = requests.get(url, headers=headers)
-        rate_limit_check(r)
-        r.raise_for_status()
+        for attempt in range(RATE_LIMIT_RETRIES):
+            r = session.get(url, headers=headers, stream=stream,
+                            timeout=DOWNLOAD_TIMEOUT if stream else REQUEST_TIMEOUT)
+
+            # A secondary rate limit advertises Retry-After; an exhausted
+            # primary limit answers 403 with X-RateLimit-Remaining: 0 and
+            # no Retry-After. Back off until the limit lifts, then retry.
+            rate_limited = r.status_code in (403, 429) and (
+                'Retry-After' in r.headers
+                or r.headers.get('X-RateLimit-Remaining') == '0')
+
+            if rate_limited and attempt < RATE_LIMIT_RETRIES - 1:
+                if 'Retry-After' in r.headers:
+                    wait_time_s = int(r.headers['Retry-After'])
+                else:
+                    reset = int(r.headers.get(
+                        'X-RateLimit-Reset', time.time() + RATE_LIMIT_WAIT_TIME_S))
+                    wait_time_s = max(0, reset - int(time.time())) + 1
+
+                logging.warning(
+                    f'Rate limit hit. Retrying in {wait_time_s} seconds.')
+                r.close()
+                if STOP.wait(wait_time_s):
+                    exit(0)
+                continue
+
+            # Don't pay the rate_limit_check wait for a response that is
+            # about to be treated as an error anyway.
+            if not rate_limited:
+                rate_limit_check(r)
+            if r.status_code not in allow_statuses:
+                r.raise_for_status()
+            break
 
     except requests.exceptions.HTTPError as err:
         logging.error(f'Failed to connect to GitHub: {err.response.text}')
@@ -139,6 +300,432 @@ def make_request(url, headers):
     return r
 
 
+def load_cache(path):
+    """
+    Load the cache persisted by a previous backup run.
+
+    Args:
+        path (str): The path of the cache file.
+
+    Returns:
+        dict: The cache, or an empty dict if the file is missing or invalid.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path, cache):
+    """
+    Persist the cache for the next backup run.
+
+    Args:
+        path (str): The path of the cache file.
+        cache (dict): The cache to save.
+
+    Returns:
+        None
+    """
+    try:
+        with open(path, 'w') as f:
+            json.dump(cache, f)
+    except OSError:
+        logging.warning(f'Failed to save cache to {path}')
+
+
+def paginate(session, url, etags=None):
+    """
+    Yield all items from a paginated GitHub API endpoint.
+
+    Requests 100 items per page and follows the 'next' links from the
+    Link response header until the last page is reached. When an etags
+    cache is given, pages are requested conditionally (If-None-Match);
+    a 304 answer has no body and does not count against the rate limit,
+    and the cached items are reused.
+
+    Args:
+        session (Session): The requests session to use.
+        url (str): The URL of the paginated endpoint.
+        etags (dict, optional): Cache mapping page URL to its ETag,
+            items and next-page URL, updated in place.
+
+    Yields:
+        dict: The items of each page.
+    """
+    sep = '&' if '?' in url else '?'
+    next_url = f'{url}{sep}per_page=100'
+
+    while next_url:
+        cached = etags.get(next_url) if etags is not None else None
+        r = make_request(session, next_url,
+                         headers={'If-None-Match': cached['etag']} if cached else None)
+
+        if r.status_code == 304:
+            items, following = cached['items'], cached['next']
+        else:
+            body = r.json()
+            items = body['items'] if isinstance(body, dict) else body
+            following = r.links.get('next', {}).get('url')
+
+            if etags is not None and 'ETag' in r.headers:
+                etags[next_url] = {'etag': r.headers['ETag'],
+                                   'items': items, 'next': following}
+
+        yield from items
+        next_url = following
+
+
+def list_repos(session, user, authenticated=False, etags=None):
+    """
+    Fetch all repositories of a user from the REST API.
+
+    Uses the plain repository listing endpoints instead of the search
+    API: they run under the core rate limit (5000 requests/hour rather
+    than 30 searches/minute) and have no 1000-result cap, just normal
+    pagination. When the token belongs to the requested user,
+    /user/repos is used so private repositories are included.
+
+    Args:
+        session (Session): The requests session to use.
+        user (str): The GitHub user.
+        authenticated (bool, optional): Whether a token is configured.
+        etags (dict, optional): ETag cache passed through to paginate().
+
+    Returns:
+        list: The repositories found.
+    """
+    url = f'https://api.github.com/users/{user}/repos?type=owner'
+
+    if authenticated:
+        login = make_request(
+            session, 'https://api.github.com/user').json().get('login', '')
+        if login.lower() == user.lower():
+            url = ('https://api.github.com/user/repos'
+                   '?affiliation=owner,collaborator&visibility=all')
+
+    return list(paginate(session, url, etags=etags))
+
+
+def copy_response(r, f):
+    """
+    Copy a streamed response body to a file through a reusable buffer.
+
+    Each worker thread keeps a single fixed-size buffer and fills it
+    with readinto(), so no per-chunk bytes objects are allocated and
+    peak memory stays bounded at one buffer per worker regardless of
+    archive size.
+
+    Args:
+        r (Response): The streamed HTTP response.
+        f (file): The destination file, open for binary writing.
+
+    Returns:
+        int: The number of bytes copied.
+
+    Raises:
+        SystemExit: If the connection drops or times out mid-download.
+    """
+    buf = getattr(_thread_local, 'buf', None)
+    if buf is None:
+        buf = _thread_local.buf = memoryview(bytearray(COPY_BUFFER_SIZE))
+
+    bytes_written = 0
+
+    # Reading r.raw directly surfaces the urllib3 exception types, not
+    # the requests ones that make_request sees.
+    try:
+        while not STOP.is_set() and (n := r.raw.readinto(buf)) > 0:
+            # A raw (unbuffered) file makes a single write() syscall and
+            # may write short (e.g. on a filling disk); loop until the
+            # whole chunk is on its way to the kernel.
+            chunk = buf[:n]
+            while chunk:
+                chunk = chunk[f.write(chunk):]
+            bytes_written += n
+    except (requests.exceptions.Timeout, ReadTimeoutError):
+        logging.error('Request timed out')
+        exit(-1)
+    except (requests.exceptions.ConnectionError, ProtocolError):
+        logging.error('Failed to connect to GitHub')
+        exit(-1)
+
+    return bytes_written
+
+
+def graphql_repos(session, user):
+    """
+    Fetch all repositories with their branches from the GraphQL API.
+
+    A single query per 100 repositories returns the repo names, default
+    branches and branch lists together, replacing the `1 + N` REST round
+    trips (repo search plus one /branches call per repo).
+
+    Args:
+        session (Session): The requests session to use.
+        user (str): The GitHub user.
+
+    Returns:
+        list: Repositories in the REST response shape, each with an
+        additional 'branches' list (None when the repo has more than
+        100 branches and the caller must paginate them over REST), or
+        None if GraphQL is unavailable (e.g. unauthenticated) so the
+        caller can fall back to REST.
+    """
+    repos = []
+    after = None
+
+    while True:
+        try:
+            r = session.post(GRAPHQL_URL,
+                             json={'query': GRAPHQL_REPOS_QUERY,
+                                   'variables': {'login': user, 'after': after}},
+                             timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException:
+            return None
+
+        body = r.json() if r.status_code == 200 else {}
+        if 'errors' in body or body.get('data', {}).get('user') is None:
+            return None
+
+        rate_limit_check(r)
+
+        repositories = body['data']['user']['repositories']
+        for node in repositories['nodes']:
+            if node['defaultBranchRef'] is None:
+                # Empty repository, nothing to back up.
+                continue
+
+            # A repo with more than 100 branches overflows the refs page;
+            # leave its branch list unset so the caller paginates them
+            # over REST instead of silently truncating.
+            branches = None
+            if not node['refs']['pageInfo']['hasNextPage']:
+                branches = [branch['name'] for branch in node['refs']['nodes']]
+
+            repos.append({
+                'name': node['name'],
+                'pushed_at': node['pushedAt'],
+                'default_branch': node['defaultBranchRef']['name'],
+                'branches': branches,
+            })
+
+        if not repositories['pageInfo']['hasNextPage']:
+            return repos
+
+        after = repositories['pageInfo']['endCursor']
+
+
+def fetch_branch(session, user, repo_name, branch, out_dir, inflight_dir, file_extension):
+    """
+    Download the archive of a single branch to the backup directory.
+
+    Partial downloads are kept in a stable location across runs and
+    resumed with an HTTP Range request, so an interrupted backup does
+    not re-download the bytes it already has.
+
+    Args:
+        session (Session): The requests session to use.
+        user (str): The GitHub user.
+        repo_name (str): The repository name.
+        branch (str): The branch name.
+        out_dir (str): The backup directory of the current run.
+        inflight_dir (str): The directory holding partial downloads.
+        file_extension (str): The archive file extension ('zip' or 'tar.gz').
+
+    Returns:
+        int: The size in bytes of the archive, or 0 if interrupted.
+    """
+    if SIGNINT:
+        return 0
+
+    path = os.path.join(out_dir, f'{repo_name}_{branch}.{file_extension}')
+    tmp = os.path.join(inflight_dir, f'{repo_name}_{branch}.{file_extension}.part')
+    meta = f'{tmp}.validator'
+
+    # Resume a partial download from a previous run if the server
+    # honors the Range request (206); a 200 means restart from scratch.
+    # Resuming requires the validator saved with the partial: If-Range
+    # makes the server send the full archive instead of a 206 when the
+    # branch moved, so stale bytes are never spliced onto a new archive.
+    start = os.path.getsize(tmp) if os.path.exists(tmp) else 0
+    validator = None
+    if start:
+        try:
+            with open(meta) as vf:
+                validator = vf.read().strip() or None
+        except OSError:
+            validator = None
+        if validator is None:
+            # No proof the partial matches the current archive.
+            start = 0
+
+    url = f'https://github.com/{user}/{repo_name}/archive/refs/heads/{branch}.{file_extension}'
+    r = make_request(session, url, stream=True,
+                     headers={'Range': f'bytes={start}-',
+                              'If-Range': validator} if start else None,
+                     allow_statuses=(416,))
+
+    # 416: the partial is not resumable (e.g. already complete because
+    # SIGINT landed after EOF). Drop it and restart from scratch instead
+    # of failing every subsequent run on the same .part file.
+    if r.status_code == 416:
+        r.close()
+        os.remove(tmp)
+        start = 0
+        r = make_request(session, url, stream=True)
+
+    # Archives are already compressed; copy the raw body without decoding.
+    r.raw.decode_content = False
+
+    resumed = r.status_code == 206
+    if not resumed:
+        start = 0
+        # Drop any stale partial before persisting the new validator: a
+        # hard kill between the two steps must never leave old bytes
+        # paired with the new archive's validator, or the next run's
+        # If-Range would match and splice them together.
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+        # Remember which archive version the partial belongs to, so a
+        # later resume can prove the bytes still match.
+        with open(meta, 'w') as vf:
+            vf.write(r.headers.get('ETag') or r.headers.get('Last-Modified') or '')
+
+    try:
+        # Unbuffered: copy_response writes 1 MiB chunks, so each one goes
+        # to the kernel in a single write() instead of being copied
+        # through a BufferedWriter first.
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_CLOEXEC
+                     | (os.O_APPEND if resumed else os.O_TRUNC), 0o644)
+        with os.fdopen(fd, 'wb', buffering=0) as f:
+            bytes_written = copy_response(r, f)
+            os.fsync(fd)
+    finally:
+        r.close()
+
+    # Keep the partial file for the next run when interrupted mid-copy.
+    if STOP.is_set():
+        return 0
+
+    # The archive only appears under its final name once it is complete
+    # and durable; an interrupted download leaves a recognizable .part.
+    os.replace(tmp, path)
+    if os.path.exists(meta):
+        os.remove(meta)
+
+    return start + bytes_written
+
+
+def dir_size(path):
+    """
+    Compute the total size of a directory tree.
+
+    Args:
+        path (str): The directory to measure.
+
+    Returns:
+        int: The total size in bytes.
+    """
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            total += dir_size(entry.path)
+        else:
+            total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+def compress_dir(path, compress):
+    """
+    Pack a directory into a compressed tar archive and remove it.
+
+    The tarball is streamed through the chosen compressor subprocess,
+    so compression overlaps with reading the directory.
+
+    Args:
+        path (str): The directory to pack.
+        compress (str): A compressor name from COMPRESSORS.
+
+    Returns:
+        str: The path of the archive.
+    """
+    cmd, extension = COMPRESSORS[compress]
+    archive = f'{path}.{extension}'
+
+    with open(archive, 'wb') as f:
+        tar = subprocess.Popen(['tar', '-C', path, '-cf', '-', '.'],
+                               stdout=subprocess.PIPE)
+        result = subprocess.run(cmd, stdin=tar.stdout, stdout=f)
+        tar.stdout.close()
+
+        if tar.wait() != 0 or result.returncode != 0:
+            logging.error(f'Failed to compress {path}')
+            exit(-1)
+
+    shutil.rmtree(path)
+    return archive
+
+
+def clone_repo(user, repo_name, out_dir, token=None, shallow=False, compress=None):
+    """
+    Mirror-clone a repository instead of downloading branch archives.
+
+    A mirror clone transfers the objects shared between branches once
+    over the pack protocol, where per-branch archives re-download almost
+    the full history once per branch.
+
+    Args:
+        user (str): The GitHub user.
+        repo_name (str): The repository name.
+        out_dir (str): The backup directory of the current run.
+        token (str, optional): Personal access token for private repositories.
+        shallow (bool, optional): Clone only the latest commit of each branch.
+        compress (str, optional): Pack the clone into a compressed tar
+            archive with this compressor from COMPRESSORS.
+
+    Returns:
+        int: The size in bytes of the backup, or 0 if interrupted.
+    """
+    if SIGNINT:
+        return 0
+
+    clone_dir = os.path.join(out_dir, f'{repo_name}.git')
+
+    # Pass the token per-invocation instead of embedding it in the
+    # remote URL, which git would persist in the mirror's config (and
+    # thus inside the backup itself).
+    cmd = ['git']
+    if token:
+        auth = base64.b64encode(f'x-access-token:{token}'.encode()).decode()
+        cmd += ['-c', f'http.extraHeader=Authorization: Basic {auth}']
+    cmd += ['clone', '--mirror', '--quiet']
+    if shallow:
+        cmd.append('--depth=1')
+    cmd += [f'https://github.com/{user}/{repo_name}.git', clone_dir]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        # Ctrl-C hits the whole process group, so an interrupted git
+        # child exits nonzero; that's the user stopping the backup, not
+        # a clone failure.
+        if STOP.is_set():
+            return 0
+
+        stderr = result.stderr.strip()
+        if token:
+            stderr = stderr.replace(token, '***')
+        logging.error(f'Failed to clone {repo_name}: {stderr}')
+        exit(-1)
+
+    if compress is not None:
+        return os.path.getsize(compress_dir(clone_dir, compress))
+
+    return dir_size(clone_dir)
+
+
 if __name__ == '__main__':
     signal.signal(signal.SIGINT, signal_handler)
 
@@ -161,11 +748,30 @@ This software is licensed under the MIT License.
                         help='Backup all branches (default: only default branch)')
     parser.add_argument('--tar-gz', '-t', action='store_true', dest='tar_gz',
                         help='Compress the backup files using tar and gzip (default: zip)')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_WORKERS, dest='workers',
+                        help=f'Number of parallel downloads (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--git', '-g', action='store_true', dest='git_mode',
+                        help='Mirror-clone repositories with git instead of downloading archives\n'
+                             '(one bare repository per repo; shared objects are transferred once)')
+    parser.add_argument('--compress', choices=[*COMPRESSORS, 'none'], default='none',
+                        dest='compress',
+                        help='Pack --git clones into compressed tar archives (default: none).\n'
+                             'pigz and zstd use all cores; zstd is usually both faster and smaller.')
     args = parser.parse_args()
 
     user = args.user
     all_branches = args.all_branches
     tar_gz = args.tar_gz
+    workers = max(1, args.workers)
+    git_mode = args.git_mode
+    compress = args.compress if args.compress != 'none' else None
+
+    if compress is not None:
+        for binary in ('tar', COMPRESSORS[compress][0][0]):
+            if shutil.which(binary) is None:
+                logging.error(
+                    f'--compress={compress} requires {binary}, which is not installed')
+                exit(-1)
 
     file_extension = 'zip'
     if tar_gz:
@@ -181,17 +787,25 @@ This software is licensed under the MIT License.
 
     headers = {}
 
-    authenticated = False
+    token = os.environ.get('GITHUB_PERSONAL_ACCESS_TOKEN')
+    authenticated = token is not None
+
+    if authenticated:
+        headers['Authorization'] = f'token {token}'
+
+    session = make_session(headers, pool_maxsize=workers)
+    warm_connections(session)
 
-    if 'GITHUB_PERSONAL_ACCESS_TOKEN' in os.environ:
-        authenticated = True
-        headers['Authorization'] = f'token {os.environ["GITHUB_PERSONAL_ACCESS_TOKEN"]}'
+    cache_path = f'{dest}{user}_etags.json'
+    cache = load_cache(cache_path)
+    etags = cache.setdefault('etags', {})
+    pushed = cache.setdefault('pushed_at', {})
 
-    repos = make_request(
-        f'https://api.github.com/search/repositories?q=user:{user}', headers).json()['items']
+    repos = graphql_repos(session, user) if authenticated else None
+    if repos is None:
+        repos = list_repos(session, user, authenticated, etags=etags)
 
     timestamp = datetime.datetime.now().isoformat()
-    spinner = Halo(spinner='dots')
     bytes_total = 0
 
     try:
@@ -203,42 +817,89 @@ This software is licensed under the MIT License.
     logging.info(
         f"Starting backup of {user}\'s {'public ' if not authenticated else ''}GitHub repositories at {timestamp}")
 
+    out_dir = os.path.join(dest, timestamp)
+    inflight_dir = os.path.join(dest, '.inflight')
+    api_repos = f'https://api.github.com/repos/{user}'
+
     try:
-        os.makedirs(f"{dest}{timestamp}", exist_ok=False)
+        os.makedirs(out_dir, exist_ok=False)
+        os.makedirs(inflight_dir, exist_ok=True)
     except OSError:
         logging.error(
-            f'Failed to create directory {dest}/{timestamp}')
+            f'Failed to create directory {out_dir}')
         exit(-1)
 
+    tasks = []
+    fetched_repos = []
     for repo in repos:
-        def log_fmt(
-            message, name, branch): return f'{message:8s}  {name:20s} {("[" + branch+ "]"):20s}'
-
         repo_name = repo['name']
+
+        if repo.get('pushed_at') is not None and pushed.get(repo_name) == repo['pushed_at']:
+            logging.info(
+                f'Skipping {repo_name}: unchanged since last backup')
+            continue
+
+        fetched_repos.append(repo)
+
+        if git_mode:
+            # A mirror clone carries every branch; no need to resolve them.
+            tasks.append((repo_name, 'mirror'))
+            continue
+
         branches = [repo['default_branch']]
 
         if all_branches:
-            branches = [branch['name'] for branch in make_request(
-                f'https://api.github.com/repos/{user}/{repo_name}/branches', headers).json()]
+            # GraphQL already delivered the branch lists; only the REST
+            # fallback needs a /branches call per repo.
+            branches = repo.get('branches') or [branch['name'] for branch in paginate(
+                session, f'{api_repos}/{repo_name}/branches', etags=etags)]
 
         for branch in branches:
-            if SIGNINT:
-                break
-
-            spinner.text = log_fmt('Fetching', repo_name, branch)
-            spinner.start()
-
-            r = make_request(
-                f'https://github.com/{user}/{repo_name}/archive/refs/heads/{branch}.{file_extension}', headers=headers)
+            tasks.append((repo_name, branch))
 
-            with open(f'{dest}{timestamp}/{repo_name}_{branch}.{file_extension}', 'wb') as f:
-                bytes_written = f.write(r.content)
-                spinner.succeed(
+    try:
+        with tqdm(total=len(tasks), unit='archive') as pbar, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            if git_mode:
+                futures = {executor.submit(clone_repo, user, repo_name, out_dir,
+                                           token, not all_branches, compress): (repo_name, branch)
+                           for repo_name, branch in tasks}
+            else:
+                futures = {executor.submit(fetch_branch, session, user, repo_name, branch,
+                                           out_dir, inflight_dir, file_extension): (repo_name, branch)
+                           for repo_name, branch in tasks}
+
+            for future in as_completed(futures):
+                repo_name, branch = futures[future]
+
+                try:
+                    bytes_written = future.result()
+                except BaseException:
+                    # A worker died (exit(-1) on a failed request etc.);
+                    # stop in-flight copies and drop the queued tasks
+                    # instead of downloading the rest before exiting.
+                    STOP.set()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+                if SIGNINT:
+                    continue
+
+                pbar.write(
                     f'{log_fmt("Saved", repo_name, branch)} ({sizeof_fmt(bytes_written)})'
                 )
+                pbar.update(1)
                 bytes_total += bytes_written
 
+        # Every download succeeded (failures exit); remember the repos as
+        # backed up so unchanged ones are skipped next run.
+        if not SIGNINT:
+            for repo in fetched_repos:
+                pushed[repo['name']] = repo.get('pushed_at')
+    finally:
+        session.close()
+        save_cache(cache_path, cache)
+
     logging.info(
         f'Backup completed at {datetime.datetime.now().isoformat()}, {sizeof_fmt(bytes_total)} written to {dest} in {(datetime.datetime.now() - datetime.datetime.fromisoformat(timestamp)).total_seconds() / 60:.1f} minutes',
     )
-    spinner.stop()